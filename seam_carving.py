@@ -3,7 +3,241 @@ Image Smart Resizing Project
 """
 
 import numpy as np
-from skimage import color
+from numba import njit, prange
+
+
+@njit(cache=True)
+def _pixel_energy(gray, i, j):
+    """Sum of the absolute gradients of gray at pixel (i, j).
+    Same differences as np.gradient: central in the interior, one-sided on the borders.
+    """
+    H, W = gray.shape
+    if H == 1:
+        gy = 0.0
+    elif i == 0:
+        gy = gray[1, j] - gray[0, j]
+    elif i == H-1:
+        gy = gray[H-1, j] - gray[H-2, j]
+    else:
+        gy = 0.5 * (gray[i+1, j] - gray[i-1, j])
+    if W == 1:
+        gx = 0.0
+    elif j == 0:
+        gx = gray[i, 1] - gray[i, 0]
+    elif j == W-1:
+        gx = gray[i, W-1] - gray[i, W-2]
+    else:
+        gx = 0.5 * (gray[i, j+1] - gray[i, j-1])
+    return abs(gy) + abs(gx)
+
+
+@njit(cache=True, parallel=True, fastmath=True)
+def _energy_nb(gray, out):
+    """Writes the energy of the (H, W) grayscale image into out in a single sweep.
+    Pixels are independent, so rows are computed in parallel.
+    """
+    H, W = gray.shape
+    for i in prange(H):
+        for j in range(W):
+            out[i, j] = _pixel_energy(gray, i, j)
+
+
+@njit(cache=True)
+def _update_energy_nb(gray, energy, seam):
+    """Recomputes energy in a band around the removed seam.
+    Removing pixel (i, seam[i]) only changes the gradients of columns seam[i]-1 and seam[i]
+    (the neighbours of the seam in rows i-1, i and i+1), the band is kept a bit larger.
+    """
+    H, W = gray.shape
+    for i in range(H):
+        for j in range(max(0, seam[i] - 2), min(W, seam[i] + 2)):
+            energy[i, j] = _pixel_energy(gray, i, j)
+
+
+@njit(cache=True)
+def _min3(a, b, c):
+    """Returns the min of a, b, c and its index (left-most in case of equality).
+    Written with selects only, so that the DP loops have no data-dependent branches.
+    """
+    ab = a <= b
+    m = a if ab else b
+    idx = 0 if ab else 1
+    mc = m <= c
+    m = m if mc else c
+    idx = idx if mc else 2
+    return m, idx
+
+
+@njit(cache=True)
+def _compute_cost_nb(energy, cost, paths):
+    """Fills cost and paths row by row, given that cost[0] is already initialized.
+    For each pixel we scan the three parents once, keeping both the min and the argmin.
+    """
+    H, W = energy.shape
+    inf = np.float32(np.inf)
+    for i in range(1, H):
+        for j in range(W):
+            a = cost[i-1, j-1] if j > 0 else inf
+            b = cost[i-1, j]
+            c = cost[i-1, j+1] if j < W-1 else inf
+            m, idx = _min3(a, b, c)
+            cost[i, j] = m + energy[i, j]
+            paths[i, j] = idx - 1
+
+
+@njit(cache=True, parallel=True, fastmath=True)
+def _forward_cost_terms_nb(image, c_l, c_m, c_r):
+    """Computes the forward energy added when coming from the left, middle and right parents.
+    These only depend on the (H, W) grayscale image, so rows are computed in parallel.
+    Row 0 and the moves going out of the image are set to 0.
+    """
+    H, W = image.shape
+    for i in prange(H):
+        for j in range(W):
+            c_l[i, j] = 0
+            c_m[i, j] = 0
+            c_r[i, j] = 0
+            if i == 0:
+                continue
+            c_v = 0.0
+            if j > 0 and j < W-1:
+                c_v = np.abs(image[i, j+1] - image[i, j-1])
+                c_m[i, j] = c_v
+            if j > 0:
+                c_l[i, j] = c_v + np.abs(image[i-1, j] - image[i, j-1])
+            if j < W-1:
+                c_r[i, j] = c_v + np.abs(image[i-1, j] - image[i, j+1])
+
+
+@njit(cache=True)
+def _compute_forward_cost_nb(c_l, c_m, c_r, energy, cost, paths):
+    """Fills the forward cost and paths row by row, given that cost[0] is already initialized.
+    c_l, c_m and c_r are the forward energies from _forward_cost_terms_nb.
+    """
+    H, W = energy.shape
+    inf = np.float32(np.inf)
+    for i in range(1, H):
+        for j in range(W):
+            a = cost[i-1, j-1] + c_l[i, j] if j > 0 else inf
+            b = cost[i-1, j] + c_m[i, j]
+            c = cost[i-1, j+1] + c_r[i, j] if j < W-1 else inf
+            m, idx = _min3(a, b, c)
+            cost[i, j] = m + energy[i, j]
+            paths[i, j] = idx - 1
+
+
+@njit(cache=True)
+def _backtrack(paths, end):
+    """Follows paths up from pixel (H-1, end), see backtrack_seam."""
+    H = paths.shape[0]
+    seam = np.empty(H, dtype=np.int32)
+    seam[H-1] = end
+    for i in range(H-2, -1, -1):
+        seam[i] = seam[i+1] + paths[i+1, seam[i+1]]
+    return seam
+
+
+@njit(cache=True)
+def _find_one_seam(energy, paths):
+    """Finds the optimal seam of the energy map, like compute_cost + argmin + backtrack_seam.
+    The cost map is never materialized: we only keep the previous and current rows of costs,
+    and the full paths (written in the (H, W) workspace paths) for the backtracking.
+    """
+    H, W = energy.shape
+    paths[0] = 0
+    prev = energy[0].copy()
+    curr = np.empty_like(prev)
+    inf = np.float32(np.inf)
+    for i in range(1, H):
+        for j in range(W):
+            a = prev[j-1] if j > 0 else inf
+            b = prev[j]
+            c = prev[j+1] if j < W-1 else inf
+            m, idx = _min3(a, b, c)
+            curr[j] = m + energy[i, j]
+            paths[i, j] = idx - 1
+        prev, curr = curr, prev
+    return _backtrack(paths, np.argmin(prev))
+
+
+@njit(cache=True)
+def _remove_seam_inplace_nb(arr, seam):
+    """Removes the seam from the (H, W) array by shifting the row suffixes left by one.
+    The result is arr[:, :W-1].
+    """
+    H, W = arr.shape
+    for i in range(H):
+        for j in range(seam[i], W-1):
+            arr[i, j] = arr[i, j+1]
+
+
+@njit(cache=True)
+def _find_k_seams(gray, k, seams_out, indices_out):
+    """Finds k seams of the (H, W) grayscale image, like find_seams with the default functions.
+    Instead of allocating a smaller image at each step, gray, energy and indices_out are
+    compacted in place (row suffixes shifted left by one) and we keep track of the live width w.
+    The seam number i is written with value i+1 in seams_out.
+    """
+    H, W = gray.shape
+    energy = np.empty((H, W), dtype=gray.dtype)
+    _energy_nb(gray, energy)
+    paths = np.empty((H, W), dtype=np.int8)
+
+    w = W
+    for n in range(k):
+        # Get the current optimal seam
+        seam = _find_one_seam(energy[:, :w], paths[:, :w])
+
+        # Store it, and remove it from gray, energy and indices_out
+        for i in range(H):
+            seams_out[i, indices_out[i, seam[i]]] = n + 1
+        _remove_seam_inplace_nb(gray[:, :w], seam)
+        _remove_seam_inplace_nb(energy[:, :w], seam)
+        _remove_seam_inplace_nb(indices_out[:, :w], seam)
+        w -= 1
+        _update_energy_nb(gray[:, :w], energy[:, :w], seam)
+
+
+@njit(cache=True)
+def _disjoint_seams_nb(paths, ends, k):
+    """Backtracks seams from the given ends (in order) and keeps the first k disjoint ones.
+    Every pixel of a kept seam is labeled, a candidate is rejected as soon as it
+    reaches a labeled pixel.
+    """
+    H, W = paths.shape
+    used = np.zeros((H, W), dtype=np.bool_)
+    seams = np.empty((k, H), dtype=np.int32)
+    seam = np.empty(H, dtype=np.int32)
+    n = 0
+    for end in ends:
+        if n == k:
+            break
+        seam[H-1] = end
+        ok = not used[H-1, end]
+        i = H-2
+        while ok and i >= 0:
+            seam[i] = seam[i+1] + paths[i+1, seam[i+1]]
+            ok = not used[i, seam[i]]
+            i -= 1
+        if ok:
+            for i in range(H):
+                used[i, seam[i]] = True
+            seams[n] = seam
+            n += 1
+    return seams[:n]
+
+
+def _rgb2gray(rgb):
+    """Converts an RGB image to a float32 grayscale image.
+    Same coefficients as skimage.color.rgb2gray, integer images are scaled to [0, 1].
+    """
+    scale = 1.0
+    if np.issubdtype(rgb.dtype, np.integer):
+        scale = 1.0 / np.iinfo(rgb.dtype).max
+    gray = (rgb[..., 0] * np.float32(0.2125 * scale)
+            + rgb[..., 1] * np.float32(0.7154 * scale)
+            + rgb[..., 2] * np.float32(0.0721 * scale))
+    return gray.astype(np.float32, copy=False)
 
 
 def energy_function(image):
@@ -14,68 +248,87 @@ def energy_function(image):
     Returns:
         out: numpy array of shape (H, W)
     """
-    H, W, _ = image.shape
-    out = np.zeros((H, W))
-    gray_image = color.rgb2gray(image)
+    gray_image = _rgb2gray(image)
 
-    axis_zero = np.absolute(np.gradient(gray_image, axis=0))
-    axis_one = np.absolute(np.gradient(gray_image, axis=1))
-    out = axis_zero + axis_one
+    return gray_energy_function(gray_image)
+
+
+def gray_energy_function(gray):
+    """Computes energy of a grayscale image, like energy_function without the conversion.
+    Args:
+        gray: float32 numpy array of shape (H, W)
+    Returns:
+        out: numpy array of shape (H, W)
+    """
+    H, W = gray.shape
+    out = np.empty((H, W), dtype=np.float32)
+    _energy_nb(gray, out)
 
     return out
 
 
-def compute_cost(image, energy, axis=1):
+def update_energy_after_seam(gray, energy, seam, inplace=False):
+    """Updates the energy map of an image after one of its seams has been removed.
+    We remove the seam from the energy map, and only recompute energy near the seam:
+    the gradients of all the other pixels are unchanged.
+    This gives the same result as gray_energy_function(gray).
+    Args:
+        gray: float32 numpy array of shape (H, W-1), grayscale image after removing the seam
+        energy: numpy array of shape (H, W), energy of the image before removing the seam
+        seam: numpy array of shape (H,) containing indices of the removed seam
+        inplace: if True, energy is overwritten and out is a view of it
+    Returns:
+        out: numpy array of shape (H, W-1)
+    """
+    if inplace:
+        _remove_seam_inplace_nb(energy, seam)
+        out = energy[:, :-1]
+    else:
+        out = remove_seam(energy, seam)
+    _update_energy_nb(gray, out, seam)
+
+    return out
+
+
+def compute_cost(image, energy, axis=1, cost_out=None, paths_out=None):
     """Computes optimal cost map (vertical) and paths of the seams.
     Starting from the first row, compute the cost of each pixel as the sum of energy along the
     lowest energy path from the top.
     We also return the paths, which will contain at each pixel either -1, 0 or 1 depending on
     where to go up if we follow a seam at this pixel.
     In the case that energies are equal, choose the left-most path. 
-    Use a stacked matrix with left, middle, and right costs
-    to make cost and paths calculations easier.
+    The row-by-row dynamic programming is done by the compiled kernel _compute_cost_nb.
     Args:
         image: not used for this function
                (this is to have a common interface with compute_forward_cost)
         energy: numpy array of shape (H, W)
         axis: compute cost in width (axis=1) or height (axis=0)
+        cost_out: optional float32 workspace for the cost, of shape at least (H, W)
+                  (W, H) if axis=0
+        paths_out: optional int8 workspace for the paths, of shape at least (H, W)
     Returns:
         cost: numpy array of shape (H, W)
         paths: numpy array of shape (H, W) containing values -1 (up and left), 0 (straight up), or 1 (up and right)
     """
-    energy = energy.copy()
-
     if axis == 0:
         energy = np.transpose(energy, (1, 0))
+    energy = np.asarray(energy, dtype=np.float32)
 
     H, W = energy.shape
 
-    cost = np.zeros((H, W))
-    paths = np.zeros((H, W), dtype=np.int)
+    cost = np.zeros((H, W), dtype=np.float32) if cost_out is None else cost_out[:H, :W]
+    paths = np.zeros((H, W), dtype=np.int8) if paths_out is None else paths_out[:H, :W]
 
     # Initialization
     cost[0] = energy[0]
     paths[0] = 0  # we don't care about the first row of paths
 
-    mat_of_one = np.ones((H, W))
-    stack = np.zeros((3, W))
-    cost_padded = np.pad(cost,((0,0),(1,1)),'constant', constant_values=(float('inf')))
-    for i in range (1, H):  # loop through rows
-        stack[0] = cost_padded[i-1, 0:W]
-        stack[1] = cost_padded[i-1, 1:W+1]
-        stack[2] = cost_padded[i-1, 2:W+2]
-        cost_padded[i, 1:W+1] = np.amin(stack, axis=0) + energy[i]
-        paths[i] = np.argmin(stack, axis=0) - mat_of_one[i]
-    cost = cost_padded[:, 1:W+1]
+    _compute_cost_nb(energy, cost, paths)
 
     if axis == 0:
         cost = np.transpose(cost, (1, 0))
         paths = np.transpose(paths, (1, 0))
 
-    # Check that paths only contains -1, 0 or 1
-    assert np.all(np.any([paths == 1, paths == 0, paths == -1], axis=0)), \
-           "paths contains other values than -1, 0 or 1"
-
     return cost, paths
 
 
@@ -94,19 +347,39 @@ def backtrack_seam(paths, end):
     """
     
     H, W = paths.shape
-    # initialize with -1 to make sure that everything gets modified
-    seam = - np.ones(H, dtype=np.int)
+    seam = _backtrack(paths, end)
 
-    # Initialization
-    seam[H-1] = end
+    if __debug__:
+        # Check that seam only contains values in [0, W-1]
+        assert np.all(np.all([seam >= 0, seam < W], axis=0)), "seam contains values out of bounds"
 
-    for i in range(H-2, -1, -1):
-        seam[i] = seam[i+1] + paths[i+1, seam[i+1]]
+    return seam
 
-    # Check that seam only contains values in [0, W-1]
-    assert np.all(np.all([seam >= 0, seam < W], axis=0)), "seam contains values out of bounds"
 
-    return seam
+def find_disjoint_seams(cost, paths, k):
+    """Finds up to k seams that don't share any pixel, from a single cost map.
+    We backtrack the seams starting from the k lowest cost ends, and reject the seams that
+    cross a seam already selected. This approximates removing the k seams one at a time,
+    without having to recompute the cost map after each seam.
+    Less than k seams are returned when some of them are rejected.
+    Args:
+        cost: numpy array of shape (H, W)
+        paths: numpy array of shape (H, W) containing values -1, 0 or 1
+        k: maximum number of seams to find
+    Returns:
+        seams: numpy array of shape (n, H) with n <= k, sorted by increasing cost.
+               Seam number i is made of the pixels (j, seams[i, j])
+    """
+
+    H, W = paths.shape
+    if k < W:
+        # Only the k lowest ends are candidates: partition them out in O(W), then sort them
+        ends = np.argpartition(cost[H-1], k)[:k]
+        ends = ends[np.argsort(cost[H-1, ends], kind='stable')]
+    else:
+        ends = np.argsort(cost[H-1], kind='stable')
+
+    return _disjoint_seams_nb(paths, ends, k)
 
 
 def remove_seam(image, seam):
@@ -119,29 +392,38 @@ def remove_seam(image, seam):
              make sure that `out` has same type as `image`
     """
 
-    # Add extra dimension if 2D input
-    if len(image.shape) == 2:
-        image = np.expand_dims(image, axis=2)
+    return remove_seams(image, np.asarray(seam)[np.newaxis])
 
-    out = None
-    H, W, C = image.shape
-    
-    out = np.copy(image)
-    M, N, C = out.shape
-    for i in range(M):  # loop through rows
-        out[i, seam[i]:N-1, :] = out[i, seam[i]+1:N, :]
-    out = out[:,0:W-1,:]
 
-    out = np.squeeze(out)  # remove last dimension if C == 1
+def remove_seams(image, seams):
+    """Remove several disjoint seams from the image at once.
+    Args:
+        image: numpy array of shape (H, W, C) or shape (H, W)
+        seams: numpy array of shape (n, H) containing indices of the seams to remove
+    Returns:
+        out: numpy array of shape (H, W-n, C) or shape (H, W-n)
+    """
 
-    # Make sure that `out` has same type as `image`
-    assert out.dtype == image.dtype, \
-       "Type changed between image (%s) and out (%s) in remove_seam" % (image.dtype, out.dtype)
+    H, W = image.shape[:2]
+    n = len(seams)
+
+    # Mask of the pixels to keep: everything but the (i, seams[:, i])
+    mask = np.ones((H, W), dtype=bool)
+    mask[np.arange(H), seams] = False
+    out = image[mask].reshape((H, W - n) + image.shape[2:])
+
+    if out.ndim == 3 and out.shape[2] == 1:
+        out = out[:, :, 0]  # remove last dimension if C == 1
+
+    if __debug__:
+        # Make sure that `out` has same type as `image`
+        assert out.dtype == image.dtype, \
+           "Type changed between image (%s) and out (%s) in remove_seams" % (image.dtype, out.dtype)
 
     return out
 
 
-def reduce(image, size, axis=1, efunc=energy_function, cfunc=compute_cost, bfunc=backtrack_seam, rfunc=remove_seam):
+def reduce(image, size, axis=1, efunc=energy_function, cfunc=compute_cost, bfunc=backtrack_seam, rfunc=remove_seam, batch_size=1):
     """Reduces the size of the image using the seam carving process.
     At each step, we remove the lowest energy seam from the image. We repeat the process
     until we obtain an output of desired size.
@@ -158,6 +440,8 @@ def reduce(image, size, axis=1, efunc=energy_function, cfunc=compute_cost, bfunc
         cfunc: cost function to use
         bfunc: backtrack seam function to use
         rfunc: remove seam function to use
+        batch_size: maximum number of disjoint seams removed per cost map (see find_disjoint_seams).
+                    1 removes the seams one at a time
     Returns:
         out: numpy array of shape (size, W, 3) if axis=0, or (H, size, 3) if axis=1
     """
@@ -175,17 +459,50 @@ def reduce(image, size, axis=1, efunc=energy_function, cfunc=compute_cost, bfunc
 
     # number of iterations
     num_it = W - size
-    for i in range(num_it):
-        energy = np.zeros((H, W))
-        cost = np.zeros((H, W))
-        paths = np.zeros((H, W), dtype=np.int)
-        seam = - np.ones(H, dtype=np.int)
-        
-        energy = efunc(out)
-        cost, paths = cfunc(out, energy)
-        end = np.argmin(cost[H-1])
-        seam = bfunc(paths, end)
-        out = rfunc(out, seam)
+    if batch_size > 1 and cfunc is not compute_forward_cost:
+        # The forward cost depends on the neighbours of the seam, it is always
+        # recomputed one seam at a time
+        while out.shape[1] > size:
+            energy = efunc(out)
+            cost, paths = cfunc(out, energy)
+            seams = find_disjoint_seams(cost, paths, min(batch_size, out.shape[1] - size))
+            out = remove_seams(out, seams)
+    else:
+        # Removing a seam only changes the energy around it, so the default energy is
+        # updated in place of being recomputed over the whole image
+        incremental = efunc is energy_function
+        if incremental:
+            # Only the grayscale image is needed for the energy: it is carved along with
+            # the image, instead of converting the image at each step
+            gray = np.ascontiguousarray(_rgb2gray(out))
+            energy = gray_energy_function(gray)
+        else:
+            energy = efunc(out)
+        # The default cost and backtrack functions are fused in a single kernel
+        fused = cfunc is compute_cost and bfunc is backtrack_seam
+        # The cost and paths workspaces are allocated once, we only use their first columns
+        # as the image gets narrower
+        workspace = cfunc is compute_cost or cfunc is compute_forward_cost
+        cost_buf = np.empty((H, W), dtype=np.float32)
+        paths_buf = np.empty((H, W), dtype=np.int8)
+        for i in range(num_it):
+            w = out.shape[1]
+            if fused:
+                seam = _find_one_seam(np.asarray(energy, dtype=np.float32), paths_buf[:, :w])
+            else:
+                if workspace:
+                    cost, paths = cfunc(out, energy, cost_out=cost_buf, paths_out=paths_buf)
+                else:
+                    cost, paths = cfunc(out, energy)
+                end = np.argmin(cost[H-1])
+                seam = bfunc(paths, end)
+            out = rfunc(out, seam)
+            if incremental:
+                _remove_seam_inplace_nb(gray, seam)
+                gray = gray[:, :-1]
+                energy = update_energy_after_seam(gray, energy, seam, inplace=True)
+            else:
+                energy = efunc(out)
 
     assert out.shape[1] == size, "Output doesn't have the right shape"
 
@@ -206,17 +523,16 @@ def duplicate_seam(image, seam):
     """
 
     H, W, C = image.shape
-    out = np.zeros((H, W + 1, C))
 
-    out[:,0:W,:] = np.copy(image)
-    M, N, C = out.shape
-    for i in range(M):  # loop through rows
-        out[i, seam[i]+1:N, :] = out[i, seam[i]:N-1, :]
+    # Column of the input image to read for each output pixel: the seam pixel is read twice
+    cols = np.arange(W + 1)
+    cols = cols - (cols > seam[:, np.newaxis])  # shape (H, W+1)
+    out = image[np.arange(H)[:, np.newaxis], cols]
 
     return out
 
 
-def find_seams(image, k, axis=1, efunc=energy_function, cfunc=compute_cost, bfunc=backtrack_seam, rfunc=remove_seam):
+def find_seams(image, k, axis=1, efunc=energy_function, cfunc=compute_cost, bfunc=backtrack_seam, rfunc=remove_seam, batch_size=1):
     """Find the top k seams (with lowest energy) in the image.
     We act like if we remove k seams from the image iteratively, but we need to store their
     position to be able to duplicate them in function enlarge.
@@ -236,6 +552,8 @@ def find_seams(image, k, axis=1, efunc=energy_function, cfunc=compute_cost, bfun
         cfunc: cost function to use
         bfunc: backtrack seam function to use
         rfunc: remove seam function to use
+        batch_size: maximum number of disjoint seams found per cost map (see find_disjoint_seams).
+                    1 finds the seams one at a time
     Returns:
         seams: numpy array of shape (H, W)
     """
@@ -253,7 +571,7 @@ def find_seams(image, k, axis=1, efunc=energy_function, cfunc=compute_cost, bfun
     # We initialize `indices` with an array like (for shape (2, 4)):
     #     [[1, 2, 3, 4],
     #      [1, 2, 3, 4]]
-    indices = np.tile(range(W), (H, 1))  # shape (H, W)
+    indices = np.broadcast_to(np.arange(W, dtype=np.int32), (H, W)).copy()  # shape (H, W)
 
     # We keep track here of the seams removed in our process
     # At the end of the process, seam number i will be stored as the path of value i+1 in `seams`
@@ -261,27 +579,77 @@ def find_seams(image, k, axis=1, efunc=energy_function, cfunc=compute_cost, bfun
     #    [[0, 1, 0, 2],
     #     [1, 0, 2, 0],
     #     [1, 0, 0, 2]]
-    seams = np.zeros((H, W), dtype=np.int)
-
-    # Iteratively find k seams for removal
-    for i in range(k):
-        # Get the current optimal seam
-        energy = efunc(image)
-        cost, paths = cfunc(image, energy)
-        end = np.argmin(cost[H - 1])
-        seam = bfunc(paths, end)
-
-        # Remove that seam from the image
-        image = rfunc(image, seam)
-
-        # Store the new seam with value i+1 in the image
-        # We can assert here that we are only writing on zeros (not overwriting existing seams)
-        assert np.all(seams[np.arange(H), indices[np.arange(H), seam]] == 0), \
-            "we are overwriting seams"
-        seams[np.arange(H), indices[np.arange(H), seam]] = i + 1
-
-        # We remove the indices used by the seam, so that `indices` keep the same shape as `image`
-        indices = rfunc(indices, seam)
+    seams = np.zeros((H, W), dtype=np.int32)
+
+    if batch_size > 1 and cfunc is not compute_forward_cost:
+        # The forward cost depends on the neighbours of the seam, it is always
+        # recomputed one seam at a time
+        arange_H = np.arange(H)
+        n = 0
+        while n < k:
+            energy = efunc(image)
+            cost, paths = cfunc(image, energy)
+            batch = find_disjoint_seams(cost, paths, min(batch_size, k - n))
+            for seam in batch:
+                n += 1
+                seams[arange_H, indices[arange_H, seam]] = n
+            image = remove_seams(image, batch)
+            indices = remove_seams(indices, batch)
+    elif (efunc is energy_function and cfunc is compute_cost
+            and bfunc is backtrack_seam and rfunc is remove_seam):
+        # With the default functions, the whole loop runs in a compiled kernel
+        # working on the grayscale image only
+        gray_image = np.ascontiguousarray(_rgb2gray(image))
+        _find_k_seams(gray_image, k, seams, indices)
+    else:
+        # Removing a seam only changes the energy around it, so the default energy is
+        # updated in place of being recomputed over the whole image
+        incremental = efunc is energy_function
+        if incremental:
+            # Only the grayscale image is needed for the energy: it is carved along with
+            # the image, instead of converting the image at each step
+            gray = np.ascontiguousarray(_rgb2gray(image))
+            energy = gray_energy_function(gray)
+        else:
+            energy = efunc(image)
+        arange_H = np.arange(H)
+        # The default cost and backtrack functions are fused in a single kernel
+        fused = cfunc is compute_cost and bfunc is backtrack_seam
+        # The cost and paths workspaces are allocated once, we only use their first columns
+        # as the image gets narrower
+        workspace = cfunc is compute_cost or cfunc is compute_forward_cost
+        cost_buf = np.empty((H, W), dtype=np.float32)
+        paths_buf = np.empty((H, W), dtype=np.int8)
+
+        # Iteratively find k seams for removal
+        for i in range(k):
+            # Get the current optimal seam
+            w = image.shape[1]
+            if fused:
+                seam = _find_one_seam(np.asarray(energy, dtype=np.float32), paths_buf[:, :w])
+            else:
+                if workspace:
+                    cost, paths = cfunc(image, energy, cost_out=cost_buf, paths_out=paths_buf)
+                else:
+                    cost, paths = cfunc(image, energy)
+                end = np.argmin(cost[H - 1])
+                seam = bfunc(paths, end)
+
+            # Remove that seam from the image, and update its energy
+            image = rfunc(image, seam)
+            if incremental:
+                _remove_seam_inplace_nb(gray, seam)
+                gray = gray[:, :-1]
+                energy = update_energy_after_seam(gray, energy, seam, inplace=True)
+            else:
+                energy = efunc(image)
+
+            # Store the new seam with value i+1 in the image
+            # We are only writing on zeros: the pixels of removed seams are no longer in `indices`
+            seams[arange_H, indices[arange_H, seam]] = i + 1
+
+            # We remove the indices used by the seam, so that `indices` keep the same shape as `image`
+            indices = rfunc(indices, seam)
 
     if axis == 0:
         seams = np.transpose(seams, (1, 0))
@@ -289,7 +657,7 @@ def find_seams(image, k, axis=1, efunc=energy_function, cfunc=compute_cost, bfun
     return seams
 
 
-def enlarge(image, size, axis=1, efunc=energy_function, cfunc=compute_cost, dfunc=duplicate_seam, bfunc=backtrack_seam, rfunc=remove_seam):
+def enlarge(image, size, axis=1, efunc=energy_function, cfunc=compute_cost, dfunc=duplicate_seam, bfunc=backtrack_seam, rfunc=remove_seam, batch_size=1):
     """Enlarges the size of the image by duplicating the low energy seams.
     We start by getting the k seams to duplicate through function find_seams.
     We iterate through these seams and duplicate each one iteratively.
@@ -309,6 +677,7 @@ def enlarge(image, size, axis=1, efunc=energy_function, cfunc=compute_cost, dfun
         dfunc: duplicate seam function to use
         bfunc: backtrack seam function to use
         rfunc: remove seam function to use
+        batch_size: maximum number of disjoint seams found per cost map, see find_seams
     Returns:
         out: numpy array of shape (size, W, C) if axis=0, or (H, size, C) if axis=1
     """
@@ -325,9 +694,9 @@ def enlarge(image, size, axis=1, efunc=energy_function, cfunc=compute_cost, dfun
     assert size <= 2 * W, "size must be smaller than %d" % (2 * W)
 
     num_it = size - W
-    seams_matrix = find_seams(out, num_it, efunc=efunc, cfunc=cfunc, bfunc=bfunc, rfunc=rfunc)
-    
-    col_of_zeros = np.zeros((H))
+    seams_matrix = find_seams(out, num_it, efunc=efunc, cfunc=cfunc, bfunc=bfunc, rfunc=rfunc,
+                              batch_size=batch_size)
+
     for i in range(num_it):
         row, col = np.where(seams_matrix == i+1)
         out = dfunc(out, col)
@@ -340,7 +709,7 @@ def enlarge(image, size, axis=1, efunc=energy_function, cfunc=compute_cost, dfun
     return out
 
 
-def compute_forward_cost(image, energy):
+def compute_forward_cost(image, energy, cost_out=None, paths_out=None):
     """Computes forward cost map (vertical) and paths of the seams.
     Starting from the first row, compute the cost of each pixel as the sum of energy along the
     lowest energy path from the top.
@@ -350,49 +719,32 @@ def compute_forward_cost(image, energy):
     Args:
         image: numpy array of shape (H, W, 3) or (H, W)
         energy: numpy array of shape (H, W)
+        cost_out: optional float32 workspace for the cost, of shape at least (H, W)
+        paths_out: optional int8 workspace for the paths, of shape at least (H, W)
     Returns:
         cost: numpy array of shape (H, W)
         paths: numpy array of shape (H, W) containing values -1, 0 or 1
     """
 
-    image = color.rgb2gray(image)
+    image = _rgb2gray(image)
+    energy = np.asarray(energy, dtype=np.float32)
     H, W = image.shape
 
-    cost = np.zeros((H, W))
-    paths = np.zeros((H, W), dtype=np.int)
+    cost = np.zeros((H, W), dtype=np.float32) if cost_out is None else cost_out[:H, :W]
+    paths = np.zeros((H, W), dtype=np.int8) if paths_out is None else paths_out[:H, :W]
 
     # Initialization
     cost[0] = energy[0]
-    for j in range(W):
-        if j > 0 and j < W - 1:
-            cost[0, j] += np.abs(image[0, j+1] - image[0, j-1])
+    cost[0, 1:W-1] += np.abs(image[0, 2:] - image[0, :-2])
     paths[0] = 0  # we don't care about the first row of paths
 
-    cost_padded = cost
-    mat_of_one = np.ones((H, W))
-    stack = np.zeros((3, W))
-    for i in range (1, H):  # loop through rows
-        for j in range (W):  # loop through columns; left 
-            if j > 0 and j < W-1:
-                stack[0, j] = cost_padded[i-1, j-1] + np.absolute(image[i, j+1] - image[i, j-1]) + np.absolute(image[i-1, j] - image[i, j-1])
-                stack[1, j] = cost_padded[i-1, j] + np.absolute(image[i, j+1] - image[i, j-1])
-                stack[2, j] = cost_padded[i-1, j+1] + np.absolute(image[i, j+1] - image[i, j-1]) + np.absolute(image[i-1, j] - image[i, j+1])
-            if j == 0:
-                stack[0, j] = (float('inf'))
-                stack[1, j] = cost_padded[i-1, j]
-                stack[2, j] = cost_padded[i-1, j+1] + np.absolute(image[i-1, j] - image[i, j+1])
-            if j == W-1:
-                stack[0, j] = cost_padded[i-1, j-1] + np.absolute(image[i-1, j] - image[i, j-1])
-                stack[1, j] = cost_padded[i-1, j]
-                stack[2, j] =  (float('inf'))
-                               
-        min_index_arr = np.argmin(stack, axis=0)
-        paths[i] = min_index_arr - mat_of_one[i]
-        cost[i] = np.amin(stack, axis=0) + energy[i]
-
-    # Check that paths only contains -1, 0 or 1
-    assert np.all(np.any([paths == 1, paths == 0, paths == -1], axis=0)), \
-           "paths contains other values than -1, 0 or 1"
+    # The forward energies can be computed for all pixels at once,
+    # only the dynamic programming has to go row by row
+    c_l = np.empty((H, W), dtype=np.float32)
+    c_m = np.empty((H, W), dtype=np.float32)
+    c_r = np.empty((H, W), dtype=np.float32)
+    _forward_cost_terms_nb(image, c_l, c_m, c_r)
+    _compute_forward_cost_nb(c_l, c_m, c_r, energy, cost, paths)
 
     return cost, paths
 
@@ -411,24 +763,20 @@ def remove_object(image, mask):
     H, W, _ = image.shape
     out = np.copy(image)
 
-    num_to_remove = np.array((H))
-    n = []
-    for i in range(H):
-        num_to_remove = np.sum(mask[i],axis=0)
-        n.append(num_to_remove)
-    remove_size = np.amax(n)
-    size_reduce = W - remove_size
-    
-    for i in range(remove_size+30):
+    # The mask is carried along with the image, so that it stays aligned with `out`
+    mask = np.asarray(mask, dtype=bool)
+
+    # Each seam removes at most one pixel of the object per row, but it can miss some rows,
+    # so we keep removing seams until the whole object is gone
+    while mask.any():
         energy = energy_function(out)
-        for i in range(energy.shape[0]):
-            for j in range(energy.shape[1]):
-                if(mask[i,j] == 1):
-                    energy[i,j] = -100000
+        # Any seam going through the object must cost less than any seam avoiding it
+        energy[mask] = -(energy.max() + 1) * H
         cost, paths = compute_cost(out, energy)
         end = np.argmin(cost[H-1])
         seam = backtrack_seam(paths, end)
         out = remove_seam(out, seam)
+        mask = remove_seam(mask, seam)
     out = enlarge(out, W, 1, efunc=energy_function, cfunc=compute_cost, dfunc=duplicate_seam, bfunc=backtrack_seam, rfunc=remove_seam)
 
     assert out.shape == image.shape
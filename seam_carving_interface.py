@@ -6,7 +6,7 @@ import matplotlib.pyplot as plt
 import matplotlib.image as mpimg
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
-import imageio
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 
 from seam_carving import *
@@ -37,6 +37,30 @@ img_width_new_enlarge = None
 img_height_new_enlarge = None
 enlarged_img = None
 
+# Seam carving runs in a worker thread so that the Tk event loop stays responsive
+executor = ThreadPoolExecutor(max_workers=1)
+
+
+"""
+Helpers - run compute in the background, display and save arrays without going through files.
+"""
+def run_in_background(func, on_done, *args):
+    future = executor.submit(func, *args)
+    def poll():
+        if future.done():
+            on_done(future.result())  # Tk widgets are only touched from the main thread
+        else:
+            root.after(50, poll)
+    poll()
+
+def to_photo(arr):
+    return ImageTk.PhotoImage(Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)))
+
+def save_img(filename, arr):
+    arr = np.clip(arr, 0, 255).astype(np.uint8)
+    code = cv2.COLOR_RGBA2BGRA if arr.shape[2] == 4 else cv2.COLOR_RGB2BGR
+    cv2.imwrite(filename, cv2.cvtColor(arr, code))
+
 
 """
 Load image function. Click button to load image of user's choice.
@@ -60,11 +84,12 @@ Calculate the energy of the selected image.
 """
 def calculate_energy():
     canvas.delete("all")    # Clear canvas
+    run_in_background(energy_function, show_energy, img_array)
+def show_energy(result):
     global energy
-    energy = energy_function(img_array)
-    imageio.imwrite("/Users/Alina/Documents/Project/Seam_Carving/energy_img.png", energy)   # Turn array to image and save as energy_img.png
+    energy = result
     global energy_img
-    energy_img = ImageTk.PhotoImage(Image.open("/Users/Alina/Documents/Project/Seam_Carving/energy_img.png"))
+    energy_img = to_photo(energy * (255 / max(energy.max(), 1e-8)))   # Scale energy to [0, 255] for display
     canvas.create_image(300, 200, image=energy_img)
 energy_button = Button(root, text="First Step - Calculate Energy", command=calculate_energy)
 energy_button.grid(row=2, column=0)
@@ -74,18 +99,19 @@ energy_button.grid(row=2, column=0)
 Find the optimal seam to remove using backtracking
 """
 def find_seam():
+    run_in_background(compute_seam, show_seam)
+def compute_seam():
     vcost, vpaths = compute_cost(img_array, energy)
     end = np.argmin(vcost[-1])
     #seam_energy = vcost[-1, end]
     seam_ = backtrack_seam(vpaths, end)
 
     vseam = np.copy(img_array)
-    for row in range(vseam.shape[0]):
-        vseam[row, seam_[row], :] = np.array([1.0, 0, 0])
-
-    imageio.imwrite("/Users/Alina/Documents/Project/Seam_Carving/seam_img.png", vseam)
+    vseam[np.arange(vseam.shape[0]), seam_, :3] = (255, 0, 0)   # Draw the seam in red
+    return vseam
+def show_seam(vseam):
     global seam_img
-    seam_img = ImageTk.PhotoImage(Image.open("/Users/Alina/Documents/Project/Seam_Carving/seam_img.png"))
+    seam_img = to_photo(vseam)
     canvas.create_image(300, 200, image=seam_img)
 seam_button = Button(root, text="Second & Third Step - Calculate Cost & Find Optimal Seam", command=find_seam)
 seam_button.grid(row=3, column=0)
@@ -116,14 +142,17 @@ def reduce_size():
     canvas.delete("all")    # Clear canvas
     wdth = int(img_width_new.get())
     hght = int(img_height_new.get())
+    run_in_background(compute_reduce, show_reduced, wdth, hght)
+def compute_reduce(wdth, hght):
     #reduce_width = reduce(img_array, wdth, axis=1, cfunc=compute_forward_cost)
     #reduce_both = reduce(reduce_width, hght, axis=0, cfunc=compute_forward_cost)
     reduce_width = reduce(img_array, wdth, axis=1)
     reduce_both = reduce(reduce_width, hght, axis=0)
-
-    imageio.imwrite("/Users/Alina/Documents/Project/Seam_Carving/reduced_img.png", reduce_both)
+    save_img("/Users/Alina/Documents/Project/Seam_Carving/reduced_img.png", reduce_both)
+    return reduce_both
+def show_reduced(reduce_both):
     global reduced_img
-    reduced_img = ImageTk.PhotoImage(Image.open("/Users/Alina/Documents/Project/Seam_Carving/reduced_img.png"))
+    reduced_img = to_photo(reduce_both)
     canvas.create_image(300, 200, image=reduced_img)
     prompt = Label(root, text="Image is being saved in the folder as \"reduced_img\".")
     prompt.grid(row=7, column=1)
@@ -156,12 +185,15 @@ def enlarge_size():
     canvas.delete("all")    # Clear canvas
     wdth = int(img_width_new_enlarge.get())
     hght = int(img_height_new_enlarge.get())
+    run_in_background(compute_enlarge, show_enlarged, wdth, hght)
+def compute_enlarge(wdth, hght):
     enlarged_width = enlarge(img_array, wdth, axis=1)
     enlarged_both = enlarge(enlarged_width, hght, axis=0)
-
-    imageio.imwrite("/Users/Alina/Documents/Project/Seam_Carving/enlarged_img.png", enlarged_both)
+    save_img("/Users/Alina/Documents/Project/Seam_Carving/enlarged_img.png", enlarged_both)
+    return enlarged_both
+def show_enlarged(enlarged_both):
     global enlarged_img
-    enlarged_img = ImageTk.PhotoImage(Image.open("/Users/Alina/Documents/Project/Seam_Carving/enlarged_img.png"))
+    enlarged_img = to_photo(enlarged_both)
     canvas.create_image(300, 200, image=enlarged_img)
     prompt = Label(root, text="Image is being saved in the folder as \"enlarged_img\".")
     prompt.grid(row=11, column=1)